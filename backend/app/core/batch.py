@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+from functools import partial
+from typing import Any, Callable, Hashable
+
+
+class BatchLoader:
+    # Coalesces concurrent single-key loads into one blocking batch call run off the event loop.
+    def __init__(
+        self,
+        batch_load: Callable[[list[Any]], dict[Any, Any]],
+        *,
+        window_sec: float = 0.01,
+        max_batch_size: int = 100,
+    ) -> None:
+        self._batch_load = batch_load
+        self.window_sec = window_sec
+        self.max_batch_size = max_batch_size
+        self._pending: dict[Hashable, list[asyncio.Future[Any]]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Any] = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_sec, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        task = asyncio.get_running_loop().create_task(self._dispatch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(partial(self._settle, pending))
+
+    async def _dispatch(self, pending: dict[Hashable, list[asyncio.Future[Any]]]) -> None:
+        try:
+            results = await asyncio.to_thread(self._batch_load, list(pending))
+            for key, futures in pending.items():
+                value = results.get(key)
+                for future in futures:
+                    if not future.done():
+                        future.set_result(value)
+        except Exception as exc:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _settle(self, pending: dict[Hashable, list[asyncio.Future[Any]]], task: asyncio.Task[None]) -> None:
+        # Runs even if the dispatch task was cancelled before it started, so no caller awaits forever.
+        self._tasks.discard(task)
+        for futures in pending.values():
+            for future in futures:
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+_caches_by_tag: dict[str, list[TTLCache]] = {}
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def _default_key(*args: Any, **kwargs: Any) -> Hashable:
+    return args, tuple(sorted(kwargs.items()))
+
+
+def ttl_cache(
+    *,
+    maxsize: int = 256,
+    ttl: float = 60.0,
+    key: Callable[..., Hashable] = _default_key,
+    tags: tuple[str, ...] = (),
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        for tag in tags:
+            _caches_by_tag.setdefault(tag, []).append(cache)
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cache_key = key(*args, **kwargs)
+            value = cache.get(cache_key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                cache.set(cache_key, value)
+            return value
+
+        wrapper.cache_clear = cache.clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+def invalidate(tag: str) -> None:
+    for cache in _caches_by_tag.get(tag, []):
+        cache.clear()
@@ -1,25 +1,33 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 import os
 
 from dotenv import load_dotenv
 
 
+@lru_cache(maxsize=1)
 def _load_env() -> None:
     backend_dir = Path(__file__).resolve().parents[2]
     repo_root = backend_dir.parent
-    load_dotenv(repo_root / ".env")
-    load_dotenv(backend_dir / ".env")
+    for env_file in (repo_root / ".env", backend_dir / ".env"):
+        # Skip the dotenv parse entirely when the file is absent.
+        if env_file.is_file():
+            load_dotenv(env_file)
 
 
-_load_env()
+def _env(name: str) -> str:
+    _load_env()
+    return os.environ.get(name, "").strip().strip('"').strip("'")
 
 
+@dataclass(frozen=True, slots=True)
 class Settings:
     app_name: str = "WatchPulse API"
     app_version: str = "0.1.0"
     rolex_brand: str = "rolex"
-    supabase_url: str = os.getenv("SUPABASE_URL", "").strip().strip('"').strip("'")
-    supabase_key: str = os.getenv("SUPABASE_KEY", "").strip().strip('"').strip("'")
+    supabase_url: str = field(default_factory=lambda: _env("SUPABASE_URL"))
+    supabase_key: str = field(default_factory=lambda: _env("SUPABASE_KEY"))
 
 
 settings = Settings()
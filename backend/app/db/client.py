@@ -1,12 +1,54 @@
 from functools import lru_cache
+from typing import Any, Callable, Iterator
 
+import httpx
 from supabase import Client, create_client
 
 from app.core.config import settings
 
+PAGE_SIZE = 1000
+
+_POSTGREST_POOL_LIMITS = httpx.Limits(
+    max_keepalive_connections=20,
+    max_connections=50,
+    keepalive_expiry=30.0,
+)
+
+
+def _use_pooled_postgrest_session(client: Client) -> None:
+    # Keep idle connections around long enough to skip TLS handshakes between API requests.
+    session = client.postgrest.session
+    client.postgrest.session = httpx.Client(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+        transport=httpx.HTTPTransport(http2=True, limits=_POSTGREST_POOL_LIMITS, retries=1),
+    )
+    session.close()
+
 
 @lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
     if not settings.supabase_url or not settings.supabase_key:
         raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY environment variables.")
-    return create_client(settings.supabase_url, settings.supabase_key)
+    client = create_client(settings.supabase_url, settings.supabase_key)
+    _use_pooled_postgrest_session(client)
+    return client
+
+
+def fetch_all(build_query: Callable[[], Any], page_size: int = PAGE_SIZE) -> Iterator[dict[str, Any]]:
+    # PostgREST caps each response (1000 rows on Supabase); walk ordered pages so large reads are not truncated.
+    # The project's max-rows may be lower than page_size, so a short page is not the end: advance by the rows
+    # actually returned. Callers select with count="exact" so the read stops at the total without an extra
+    # request; without a count it stops on the first empty page.
+    start = 0
+    while True:
+        response = build_query().range(start, start + page_size - 1).execute()
+        rows = response.data or []
+        if not rows:
+            return
+        yield from rows
+        start += len(rows)
+        if response.count is not None and start >= response.count:
+            return
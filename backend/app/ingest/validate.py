@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass
-from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
 from typing import Any
 
+from postgrest.exceptions import APIError
+from supabase import Client
+
 from app.db.client import get_supabase_client
 
 
@@ -20,103 +24,87 @@ class ValidationReport:
     duplicate_url_examples: list[dict[str, Any]]
 
     def to_dict(self) -> dict[str, Any]:
-        return asdict(self)
+        # Fields already hold JSON-ready values, so a shallow copy avoids asdict's recursive deep copy.
+        return dict(self.__dict__)
 
 
-def _get_brand_model_ids(brand: str) -> list[int]:
-    client = get_supabase_client()
-    response = client.table("brand_models").select("id").eq("brand", brand).execute()
-    return [int(row["id"]) for row in (response.data or [])]
+def _check_duplicate_urls(client: Client, brand: str) -> tuple[int, list[dict[str, Any]]]:
+    # Aggregated server-side: only the top duplicates (plus the total) cross the wire.
+    response = client.rpc("brand_duplicate_urls", {"brand": brand}).execute()
+    rows = response.data or []
+    total = int(rows[0]["total"]) if rows else 0
+    return total, [{"url": row["url"], "count": int(row["count"])} for row in rows]
 
 
-def _check_duplicate_urls(model_ids: list[int]) -> tuple[int, list[dict[str, Any]]]:
-    if not model_ids:
-        return 0, []
-    client = get_supabase_client()
-    response = client.table("market_listings").select("url").in_("model_id", model_ids).execute()
-    seen: dict[str, int] = {}
-    for row in (response.data or []):
-        url = str(row.get("url") or "").strip()
-        if not url:
-            continue
-        seen[url] = seen.get(url, 0) + 1
-
-    duplicates = [{"url": url, "count": count} for url, count in seen.items() if count > 1]
-    duplicates.sort(key=lambda x: x["count"], reverse=True)
-    return len(duplicates), duplicates[:10]
-
-
-def _check_missing_stats(model_ids: list[int], captured_date: date) -> tuple[int, list[int]]:
-    if not model_ids:
-        return 0, []
-    client = get_supabase_client()
-    response = (
-        client.table("model_daily_stats")
-        .select("model_id")
-        .eq("captured_date", captured_date.isoformat())
-        .in_("model_id", model_ids)
-        .execute()
-    )
-    present = {int(row["model_id"]) for row in (response.data or [])}
-    missing = sorted(mid for mid in model_ids if mid not in present)
+def _check_missing_stats(client: Client, brand: str, captured_date: date) -> tuple[int, list[int]]:
+    # Anti-join runs server-side; only the ids without a stats row come back.
+    response = client.rpc(
+        "missing_model_ids",
+        {"brand": brand, "d": captured_date.isoformat()},
+    ).execute()
+    missing = [int(row["id"]) for row in (response.data or [])]
     return len(missing), missing
 
 
 def _check_price_anomalies(
-    model_ids: list[int],
+    client: Client,
+    brand: str,
     captured_date: date,
     threshold_pct: float,
 ) -> tuple[int, list[dict[str, Any]]]:
-    if not model_ids:
-        return 0, []
+    # Day-over-day self-join runs server-side; only rows above the threshold come back.
+    response = client.rpc(
+        "price_anomalies",
+        {"brand": brand, "d": captured_date.isoformat(), "threshold": threshold_pct},
+    ).execute()
+    rows = response.data or []
+    total = int(rows[0]["total"]) if rows else 0
+    return total, [
+        {
+            "listing_id": int(row["listing_id"]),
+            "prev_price": float(row["prev_price"]),
+            "curr_price": float(row["curr_price"]),
+            "pct_jump": float(row["pct_jump"]),
+        }
+        for row in rows
+    ]
+
+
+def _run_validations_rpc(client: Client, brand: str, captured_date: date, threshold_pct: float) -> dict[str, Any]:
+    response = client.rpc(
+        "run_ingest_validations",
+        {"brand": brand, "captured_date": captured_date.isoformat(), "threshold": threshold_pct},
+    ).execute()
+    return response.data or {}
+
+
+def _run_validations_per_check(
+    client: Client,
+    brand: str,
+    captured_date: date,
+    threshold_pct: float,
+) -> ValidationReport:
+    # The checks are independent, so overlap their round-trips instead of paying them back to back.
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        duplicates_future = pool.submit(_check_duplicate_urls, client, brand)
+        missing_future = pool.submit(_check_missing_stats, client, brand, captured_date)
+        anomalies_future = pool.submit(_check_price_anomalies, client, brand, captured_date, threshold_pct)
+        duplicate_count, duplicate_examples = duplicates_future.result()
+        missing_count, missing_model_ids = missing_future.result()
+        anomaly_count, anomaly_examples = anomalies_future.result()
 
-    client = get_supabase_client()
-    listings_res = client.table("market_listings").select("id").in_("model_id", model_ids).execute()
-    listing_ids = [int(row["id"]) for row in (listings_res.data or [])]
-    if not listing_ids:
-        return 0, []
-
-    prev_date = captured_date - timedelta(days=1)
-    snapshots_res = (
-        client.table("listing_snapshots")
-        .select("listing_id,captured_date,price_value")
-        .in_("listing_id", listing_ids)
-        .in_("captured_date", [prev_date.isoformat(), captured_date.isoformat()])
-        .execute()
+    return ValidationReport(
+        captured_date=captured_date.isoformat(),
+        brand=brand,
+        anomaly_threshold_pct=threshold_pct,
+        anomaly_count=anomaly_count,
+        anomaly_examples=anomaly_examples,
+        missing_stats_count=missing_count,
+        missing_stats_model_ids=missing_model_ids,
+        duplicate_url_count=duplicate_count,
+        duplicate_url_examples=duplicate_examples,
     )
 
-    prev_prices: dict[int, float] = {}
-    curr_prices: dict[int, float] = {}
-    for row in (snapshots_res.data or []):
-        listing_id = int(row["listing_id"])
-        value = row.get("price_value")
-        if value is None:
-            continue
-        price = float(value)
-        date_s = str(row.get("captured_date"))
-        if date_s == prev_date.isoformat():
-            prev_prices[listing_id] = price
-        elif date_s == captured_date.isoformat():
-            curr_prices[listing_id] = price
-
-    anomalies: list[dict[str, Any]] = []
-    for listing_id, curr in curr_prices.items():
-        prev = prev_prices.get(listing_id)
-        if prev is None or prev <= 0:
-            continue
-        pct_jump = abs((curr - prev) / prev) * 100.0
-        if pct_jump > threshold_pct:
-            anomalies.append(
-                {
-                    "listing_id": listing_id,
-                    "prev_price": round(prev, 2),
-                    "curr_price": round(curr, 2),
-                    "pct_jump": round(pct_jump, 2),
-                }
-            )
-    anomalies.sort(key=lambda x: x["pct_jump"], reverse=True)
-    return len(anomalies), anomalies[:10]
-
 
 def run_ingest_validations(
     *,
@@ -124,19 +112,35 @@ def run_ingest_validations(
     captured_date: date,
     anomaly_threshold_pct: float = 25.0,
 ) -> ValidationReport:
-    model_ids = _get_brand_model_ids(brand)
-    duplicate_count, duplicate_examples = _check_duplicate_urls(model_ids)
-    missing_count, missing_model_ids = _check_missing_stats(model_ids, captured_date)
-    anomaly_count, anomaly_examples = _check_price_anomalies(model_ids, captured_date, anomaly_threshold_pct)
+    client = get_supabase_client()
+    # Preferred query shape: every check in one server-side round-trip.
+    try:
+        result = _run_validations_rpc(client, brand, captured_date, anomaly_threshold_pct)
+    except APIError as exc:
+        # PGRST202: the fused function is not in the schema cache yet; any other failure is real.
+        if exc.code != "PGRST202":
+            raise
+        return _run_validations_per_check(client, brand, captured_date, anomaly_threshold_pct)
 
     return ValidationReport(
         captured_date=captured_date.isoformat(),
         brand=brand,
         anomaly_threshold_pct=anomaly_threshold_pct,
-        anomaly_count=anomaly_count,
-        anomaly_examples=anomaly_examples,
-        missing_stats_count=missing_count,
-        missing_stats_model_ids=missing_model_ids,
-        duplicate_url_count=duplicate_count,
-        duplicate_url_examples=duplicate_examples,
+        anomaly_count=int(result.get("anomaly_count") or 0),
+        anomaly_examples=[
+            {
+                "listing_id": int(row["listing_id"]),
+                "prev_price": float(row["prev_price"]),
+                "curr_price": float(row["curr_price"]),
+                "pct_jump": float(row["pct_jump"]),
+            }
+            for row in (result.get("anomaly_examples") or [])
+        ],
+        missing_stats_count=int(result.get("missing_stats_count") or 0),
+        missing_stats_model_ids=[int(mid) for mid in (result.get("missing_model_ids") or [])],
+        duplicate_url_count=int(result.get("duplicate_url_count") or 0),
+        duplicate_url_examples=[
+            {"url": row["url"], "count": int(row["count"])}
+            for row in (result.get("duplicate_url_examples") or [])
+        ],
     )
@@ -20,9 +20,9 @@ def get_models(
 
 
 @router.get("/{model_id}")
-def get_model_by_id(model_id: int) -> dict:
+async def get_model_by_id(model_id: int) -> dict:
     try:
-        payload = get_model_detail(model_id)
+        payload = await get_model_detail(model_id)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to fetch model detail: {exc}") from exc
 
@@ -1,7 +1,12 @@
+import asyncio
 from typing import Any
 
+from postgrest.exceptions import APIError
+
+from app.core.batch import BatchLoader
+from app.core.cache import ttl_cache
 from app.core.config import settings
-from app.db.client import get_supabase_client
+from app.db.client import fetch_all, get_supabase_client
 
 ALLOWED_SORTS = {
     "wait_time_index_desc",
@@ -10,58 +15,35 @@ ALLOWED_SORTS = {
     "price_desc",
 }
 
+# Sort key -> (view column, descending). Missing stats always sort last.
+SORT_COLUMNS: dict[str, tuple[str, bool]] = {
+    "wait_time_index_desc": ("wait_time_index", True),
+    "premium_desc": ("premium_over_msrp", True),
+    "price_asc": ("current_median_price", False),
+    "price_desc": ("current_median_price", True),
+}
 
-def _latest_stats_by_model(model_ids: list[int]) -> dict[int, dict[str, Any]]:
-    if not model_ids:
-        return {}
+LIST_COLUMNS = (
+    "id,brand,collection,model_name,ref_code,msrp,image_url,"
+    "current_median_price,premium_over_msrp,wait_band,wait_time_index"
+)
 
-    client = get_supabase_client()
-    # Preferred query shape: one row per model from a DISTINCT ON view.
-    try:
-        view_response = (
-            client.table("model_latest_stats")
-            .select("model_id,median_price,wait_band,wait_time_index,premium_over_msrp")
-            .in_("model_id", model_ids)
-            .execute()
-        )
-        return {int(row["model_id"]): row for row in (view_response.data or [])}
-    except Exception:
-        # Backward-compatible fallback if the view has not been created yet.
-        stats_response = (
-            client.table("model_daily_stats")
-            .select("model_id,captured_date,median_price,wait_band,wait_time_index,premium_over_msrp")
-            .in_("model_id", model_ids)
-            .order("model_id")
-            .order("captured_date", desc=True)
-            .execute()
-        )
-        latest: dict[int, dict[str, Any]] = {}
-        for row in stats_response.data or []:
-            model_id = int(row["model_id"])
-            if model_id not in latest:
-                latest[model_id] = row
-        return latest
-
-
-def _sort_items(items: list[dict[str, Any]], sort: str) -> list[dict[str, Any]]:
-    def null_last(value: Any, fallback: float) -> float:
-        if value is None:
-            return fallback
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return fallback
-
-    if sort == "premium_desc":
-        return sorted(items, key=lambda x: null_last(x.get("premium_over_msrp"), -10_000.0), reverse=True)
-    if sort == "price_asc":
-        return sorted(items, key=lambda x: null_last(x.get("current_median_price"), 10_000_000_000.0))
-    if sort == "price_desc":
-        return sorted(items, key=lambda x: null_last(x.get("current_median_price"), -1.0), reverse=True)
-    # default and explicit wait_time_index_desc
-    return sorted(items, key=lambda x: null_last(x.get("wait_time_index"), -10_000.0), reverse=True)
 
+def _filtered_models(client: Any, columns: str, *, q: str | None, collection: str | None, head: bool = False) -> Any:
+    query = (
+        client.table("brand_models_with_stats")
+        .select(columns, count="exact", head=head)
+        .eq("brand", settings.rolex_brand)
+    )
+    if collection:
+        query = query.ilike("collection", f"%{collection}%")
+    if q:
+        safe_q = q.replace(",", " ").strip()
+        query = query.or_(f"model_name.ilike.%{safe_q}%,ref_code.ilike.%{safe_q}%")
+    return query
 
+
+@ttl_cache(maxsize=256, ttl=60.0, tags=("model_stats",))
 def list_models(
     *,
     page: int,
@@ -72,51 +54,31 @@ def list_models(
 ) -> dict[str, Any]:
     client = get_supabase_client()
     safe_sort = sort if sort in ALLOWED_SORTS else "wait_time_index_desc"
+    sort_column, sort_desc = SORT_COLUMNS[safe_sort]
 
-    query = (
-        client.table("brand_models")
-        .select(
-            "id,brand,collection,model_name,ref_code,msrp,image_url",
-        )
-        .eq("brand", settings.rolex_brand)
-    )
-    if collection:
-        query = query.ilike("collection", f"%{collection}%")
-    if q:
-        safe_q = q.replace(",", " ").strip()
-        query = query.or_(f"model_name.ilike.%{safe_q}%,ref_code.ilike.%{safe_q}%")
-
-    # Fetch filtered models first, then sort by latest derived metrics in memory.
-    response = query.order("collection").order("model_name").execute()
-    models = response.data or []
-    model_ids = [row["id"] for row in models]
-    latest_map = _latest_stats_by_model(model_ids)
-
-    items: list[dict[str, Any]] = []
-    for row in models:
-        latest = latest_map.get(row["id"], {})
-        items.append(
-            {
-                "id": row["id"],
-                "brand": row["brand"],
-                "collection": row["collection"],
-                "model_name": row["model_name"],
-                "ref_code": row["ref_code"],
-                "msrp": row["msrp"],
-                "image_url": row["image_url"],
-                "current_median_price": latest.get("median_price"),
-                "premium_over_msrp": latest.get("premium_over_msrp"),
-                "wait_band": latest.get("wait_band"),
-                "wait_time_index": latest.get("wait_time_index"),
-            }
+    # Sort and paginate in Postgres so only one page of rows crosses the wire.
+    start = (page - 1) * page_size
+    end = start + page_size - 1
+    try:
+        response = (
+            _filtered_models(client, LIST_COLUMNS, q=q, collection=collection)
+            .order(sort_column, desc=sort_desc, nullsfirst=False)
+            .order("collection")
+            .order("model_name")
+            .order("id")
+            .range(start, end)
+            .execute()
         )
+        paged_items = response.data or []
+        total = response.count or 0
+    except APIError as exc:
+        # PostgREST answers 416 for a page past the end; keep returning an empty page.
+        if exc.code != "PGRST103":
+            raise
+        paged_items = []
+        total = _filtered_models(client, "id", q=q, collection=collection, head=True).execute().count or 0
 
-    sorted_items = _sort_items(items, safe_sort)
-    total = len(sorted_items)
     total_pages = (total + page_size - 1) // page_size if total else 0
-    start = (page - 1) * page_size
-    end = start + page_size
-    paged_items = sorted_items[start:end]
     return {
         "page": page,
         "page_size": page_size,
@@ -127,31 +89,56 @@ def list_models(
     }
 
 
-def get_model_detail(model_id: int) -> dict[str, Any] | None:
+def _load_models(model_ids: list[int]) -> dict[int, dict[str, Any]]:
     client = get_supabase_client()
-    model_response = (
+    response = (
         client.table("brand_models")
         .select("*")
-        .eq("id", model_id)
+        .in_("id", model_ids)
         .eq("brand", settings.rolex_brand)
-        .limit(1)
         .execute()
     )
-    models = model_response.data or []
-    if not models:
-        return None
+    return {int(row["id"]): row for row in (response.data or [])}
+
 
-    stats_response = (
-        client.table("model_daily_stats")
+def _load_daily_stats(model_ids: list[int]) -> dict[int, list[dict[str, Any]]]:
+    client = get_supabase_client()
+    stats_by_model: dict[int, list[dict[str, Any]]] = {}
+    for row in fetch_all(
+        lambda: client.table("model_daily_stats")
         .select(
-            "captured_date,median_price,listings_count,new_listings_count,sold_rate_proxy,premium_over_msrp,wait_time_index,wait_band"
+            "model_id,captured_date,median_price,listings_count,new_listings_count,sold_rate_proxy,premium_over_msrp,wait_time_index,wait_band",
+            count="exact",
         )
-        .eq("model_id", model_id)
+        .in_("model_id", model_ids)
+        .order("model_id")
         .order("captured_date", desc=False)
-        .execute()
+    ):
+        stats_by_model.setdefault(int(row.pop("model_id")), []).append(row)
+    return stats_by_model
+
+
+# Concurrent detail requests within a ~10ms window share one query per table.
+_model_loader = BatchLoader(_load_models)
+_daily_stats_loader = BatchLoader(_load_daily_stats)
+
+
+async def get_model_detail(model_id: int) -> dict[str, Any] | None:
+    # Both loads start together so their batch windows overlap. A stats failure only matters when the
+    # model exists; an unknown id stays a 404 rather than surfacing the stats error.
+    model, daily_stats = await asyncio.gather(
+        _model_loader.load(model_id),
+        _daily_stats_loader.load(model_id),
+        return_exceptions=True,
     )
+    if isinstance(model, BaseException):
+        raise model
+    if model is None:
+        return None
+    if isinstance(daily_stats, BaseException):
+        raise daily_stats
 
     return {
-        "model": models[0],
-        "daily_stats": stats_response.data or [],
+        "model": model,
+        "daily_stats": daily_stats or [],
     }
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from datetime import date
-from statistics import median
-from typing import Any
+from typing import Any, Iterable, Iterator
 
-from app.db.client import get_supabase_client
+from app.core.cache import invalidate
+from app.db.client import fetch_all, get_supabase_client
+
+UPSERT_CHUNK_SIZE = 500
+
+# Upper bounds (exclusive) of each wait band; an index at or above the last bound is the top band.
+WAIT_BAND_BOUNDS = (0.25, 0.45, 0.65, 0.85)
+WAIT_BAND_LABELS = ("0-6 months", "6-18 months", "18 months-3 years", "3-5 years", "5-8+ years")
 
 
 @dataclass
@@ -22,26 +29,53 @@ class ModelDayRaw:
     avg_shipping_days: float
 
 
+@dataclass(slots=True)
+class SnapshotBatch:
+    # Column-oriented view of one model's snapshots: each aggregate scans a single list
+    # instead of looking the same keys up on every row dict.
+    prices: list[float] = field(default_factory=list)
+    available: list[bool] = field(default_factory=list)
+    shipping_days: list[float] = field(default_factory=list)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict[str, Any]]) -> SnapshotBatch:
+        batch = cls()
+        for row in rows:
+            batch.append(row)
+        return batch
+
+    def append(self, row: dict[str, Any]) -> None:
+        self.available.append(bool(row.get("availability_flag")))
+        price = row.get("price_value")
+        if price is not None:
+            self.prices.append(float(price))
+        s_min = row.get("shipping_days_min")
+        s_max = row.get("shipping_days_max")
+        if s_min is not None and s_max is not None:
+            self.shipping_days.append((float(s_min) + float(s_max)) / 2.0)
+
+
 def _normalize(values: list[float]) -> list[float]:
     if not values:
         return []
     low = min(values)
-    high = max(values)
-    if high == low:
-        return [0.0 for _ in values]
-    return [(v - low) / (high - low) for v in values]
+    span = max(values) - low
+    if span == 0:
+        return [0.0] * len(values)
+    return [(v - low) / span for v in values]
+
+
+def _median(values: list[float]) -> float:
+    # Sorts in place; callers pass a scratch list, which skips the copy statistics.median makes.
+    values.sort()
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
 
 
 def _wait_band(index: float) -> str:
-    if index < 0.25:
-        return "0-6 months"
-    if index < 0.45:
-        return "6-18 months"
-    if index < 0.65:
-        return "18 months-3 years"
-    if index < 0.85:
-        return "3-5 years"
-    return "5-8+ years"
+    return WAIT_BAND_LABELS[bisect_right(WAIT_BAND_BOUNDS, index)]
 
 
 def _calc_model_raw(
@@ -49,41 +83,29 @@ def _calc_model_raw(
     model_id: int,
     msrp: float | None,
     listing_rows: list[dict[str, Any]],
-    snapshot_rows: list[dict[str, Any]],
+    snapshots: SnapshotBatch,
     captured_date: date,
 ) -> ModelDayRaw | None:
-    listing_ids = [row["id"] for row in listing_rows]
-    if not listing_ids:
-        return None
-
-    snapshots = [row for row in snapshot_rows if row["listing_id"] in listing_ids]
-    if not snapshots:
+    if not listing_rows or not snapshots.prices:
         return None
 
-    prices = [float(row["price_value"]) for row in snapshots if row.get("price_value") is not None]
-    if not prices:
-        return None
-
-    listings_count = len(snapshots)
-    available_count = sum(1 for row in snapshots if bool(row.get("availability_flag")))
-    availability_ratio = available_count / listings_count if listings_count else 0.0
+    listings_count = len(snapshots.available)
+    availability_ratio = sum(snapshots.available) / listings_count
     sold_rate_proxy = 1.0 - availability_ratio
 
+    # created_at is an ISO timestamp; a prefix check avoids slicing a new string per row.
+    captured_iso = captured_date.isoformat()
     created_today = sum(
         1
         for row in listing_rows
-        if row.get("created_at") and str(row["created_at"])[:10] == captured_date.isoformat()
+        if row.get("created_at") and str(row["created_at"]).startswith(captured_iso)
     )
 
-    shipping_values: list[float] = []
-    for row in snapshots:
-        s_min = row.get("shipping_days_min")
-        s_max = row.get("shipping_days_max")
-        if s_min is not None and s_max is not None:
-            shipping_values.append((float(s_min) + float(s_max)) / 2.0)
-    avg_shipping_days = sum(shipping_values) / len(shipping_values) if shipping_values else 7.0
+    shipping_days = snapshots.shipping_days
+    avg_shipping_days = sum(shipping_days) / len(shipping_days) if shipping_days else 7.0
 
-    median_price = float(median(prices))
+    # The price column is only read here, so it doubles as the median's scratch list.
+    median_price = _median(snapshots.prices)
     premium_over_msrp = None
     if msrp and msrp > 0:
         premium_over_msrp = (median_price / float(msrp)) - 1.0
@@ -103,21 +125,22 @@ def _calc_model_raw(
 
 
 def _score_rows(rows: list[ModelDayRaw], *, w1: float = 0.45, w2: float = 0.30, w3: float = 0.25) -> list[dict[str, Any]]:
-    premiums = [row.premium_over_msrp if row.premium_over_msrp is not None else 0.0 for row in rows]
-    availability = [row.availability_ratio for row in rows]
-    # Velocity proxy combines new listings churn and sold pressure.
-    velocities = [
-        0.6 * row.sold_rate_proxy + 0.4 * (row.new_listings_count / row.listings_count if row.listings_count else 0.0)
-        for row in rows
-    ]
-
-    premium_norm = _normalize(premiums)
-    availability_norm = _normalize(availability)
-    velocity_norm = _normalize(velocities)
+    premiums: list[float] = []
+    availability: list[float] = []
+    velocities: list[float] = []
+    for row in rows:
+        premiums.append(row.premium_over_msrp if row.premium_over_msrp is not None else 0.0)
+        availability.append(row.availability_ratio)
+        # Velocity proxy combines new listings churn and sold pressure.
+        velocities.append(
+            0.6 * row.sold_rate_proxy + 0.4 * (row.new_listings_count / row.listings_count if row.listings_count else 0.0)
+        )
 
     scored: list[dict[str, Any]] = []
-    for idx, row in enumerate(rows):
-        wait_time_index = (w1 * premium_norm[idx]) + (w2 * (1.0 - availability_norm[idx])) + (w3 * velocity_norm[idx])
+    for row, premium_norm, availability_norm, velocity_norm in zip(
+        rows, _normalize(premiums), _normalize(availability), _normalize(velocities)
+    ):
+        wait_time_index = (w1 * premium_norm) + (w2 * (1.0 - availability_norm)) + (w3 * velocity_norm)
         wait_time_index = max(0.0, min(1.0, wait_time_index))
         scored.append(
             {
@@ -138,44 +161,44 @@ def _score_rows(rows: list[ModelDayRaw], *, w1: float = 0.45, w2: float = 0.30,
 def compute_model_daily_stats(captured_date: date, brand: str = "rolex") -> list[dict[str, Any]]:
     client = get_supabase_client()
 
-    models_response = (
-        client.table("brand_models")
-        .select("id,msrp")
-        .eq("brand", brand)
-        .order("id")
-        .execute()
+    models = list(
+        fetch_all(
+            lambda: client.table("brand_models").select("id,msrp", count="exact").eq("brand", brand).order("id")
+        )
     )
-    models = models_response.data or []
     if not models:
         return []
 
     model_ids = [row["id"] for row in models]
-    listing_response = (
-        client.table("market_listings")
-        .select("id,model_id,created_at")
+    listings_by_model: dict[int, list[dict[str, Any]]] = {}
+    for row in fetch_all(
+        lambda: client.table("market_listings")
+        .select("id,model_id,created_at", count="exact")
         .in_("model_id", model_ids)
-        .execute()
-    )
-    listing_rows = listing_response.data or []
-    if not listing_rows:
+        .order("id")
+    ):
+        listings_by_model.setdefault(int(row["model_id"]), []).append(row)
+    if not listings_by_model:
         return []
 
-    listing_ids = [row["id"] for row in listing_rows]
-    snapshot_response = (
-        client.table("listing_snapshots")
-        .select("listing_id,price_value,availability_flag,shipping_days_min,shipping_days_max")
-        .eq("captured_date", captured_date.isoformat())
-        .in_("listing_id", listing_ids)
-        .execute()
-    )
-    snapshot_rows = snapshot_response.data or []
-    if not snapshot_rows:
+    # Joined by brand server-side, so no listing-id IN list travels in the URL.
+    # Pages are split into per-model columns as they arrive; the row dicts are not kept.
+    snapshots_by_model: dict[int, SnapshotBatch] = {}
+    for row in fetch_all(
+        lambda: client.rpc(
+            "daily_snapshots_for_brand",
+            {"brand": brand, "d": captured_date.isoformat()},
+            count="exact",
+        ).order("listing_id")
+    ):
+        model_id = int(row["model_id"])
+        batch = snapshots_by_model.get(model_id)
+        if batch is None:
+            batch = snapshots_by_model[model_id] = SnapshotBatch()
+        batch.append(row)
+    if not snapshots_by_model:
         return []
 
-    listings_by_model: dict[int, list[dict[str, Any]]] = {}
-    for row in listing_rows:
-        listings_by_model.setdefault(int(row["model_id"]), []).append(row)
-
     raw_rows: list[ModelDayRaw] = []
     for model in models:
         model_id = int(model["id"])
@@ -183,7 +206,7 @@ def compute_model_daily_stats(captured_date: date, brand: str = "rolex") -> list
             model_id=model_id,
             msrp=float(model["msrp"]) if model.get("msrp") is not None else None,
             listing_rows=listings_by_model.get(model_id, []),
-            snapshot_rows=snapshot_rows,
+            snapshots=snapshots_by_model.get(model_id) or SnapshotBatch(),
             captured_date=captured_date,
         )
         if raw:
@@ -192,9 +215,22 @@ def compute_model_daily_stats(captured_date: date, brand: str = "rolex") -> list
     return _score_rows(raw_rows)
 
 
-def upsert_model_daily_stats(rows: list[dict[str, Any]]) -> int:
+def _chunked(rows: list[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def upsert_model_daily_stats(rows: list[dict[str, Any]], chunk_size: int = UPSERT_CHUNK_SIZE) -> int:
     if not rows:
         return 0
     client = get_supabase_client()
-    client.table("model_daily_stats").upsert(rows, on_conflict="model_id,captured_date").execute()
-    return len(rows)
+    upserted = 0
+    # Bounded payloads keep each PostgREST request well under body-size and statement timeouts.
+    for chunk in _chunked(rows, chunk_size):
+        client.table("model_daily_stats").upsert(chunk, on_conflict="model_id,captured_date").execute()
+        upserted += len(chunk)
+    # model_latest_stats is materialized and only reflects new rows after a refresh.
+    client.rpc("refresh_model_latest_stats").execute()
+    # Cached catalog reads are derived from model_daily_stats; drop them after a write.
+    invalidate("model_stats")
+    return upserted
@@ -0,0 +1,35 @@
+import asyncio
+
+from app.core.batch import BatchLoader
+
+
+def test_concurrent_loads_share_one_batch_call():
+    calls = []
+
+    def load_many(keys):
+        calls.append(sorted(keys))
+        return {key: key * 10 for key in keys if key != 3}
+
+    async def scenario():
+        loader = BatchLoader(load_many, window_sec=0.01)
+        return await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(3))
+
+    assert asyncio.run(scenario()) == [10, 20, 10, None]
+    assert calls == [[1, 2, 3]]
+
+
+def test_cancelled_dispatch_does_not_leave_callers_waiting():
+    async def scenario():
+        loader = BatchLoader(lambda keys: {key: key for key in keys}, window_sec=0.01)
+        waiter = asyncio.ensure_future(loader.load(1))
+        await asyncio.sleep(0)
+        loader._flush()
+        for task in list(loader._tasks):
+            task.cancel()
+        try:
+            await asyncio.wait_for(waiter, timeout=1.0)
+        except asyncio.CancelledError:
+            return "cancelled"
+        return "resolved"
+
+    assert asyncio.run(scenario()) == "cancelled"
@@ -0,0 +1,34 @@
+from app.core import cache
+from app.core.cache import invalidate, ttl_cache
+
+
+def test_ttl_cache_reuses_value_until_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    calls = []
+
+    @ttl_cache(ttl=60.0)
+    def load(brand: str) -> list[int]:
+        calls.append(brand)
+        return [len(calls)]
+
+    assert load("rolex") == [1]
+    assert load("rolex") == [1]          # served from cache
+    now[0] += 61.0
+    assert load("rolex") == [2]          # expired entry is reloaded
+    assert calls == ["rolex", "rolex"]
+
+
+def test_invalidate_clears_tagged_caches():
+    calls = []
+
+    @ttl_cache(tags=("test_tag",))
+    def load(page: int) -> int:
+        calls.append(page)
+        return page
+
+    load(1)
+    load(1)
+    invalidate("test_tag")
+    load(1)
+    assert calls == [1, 1]
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from app.db.client import fetch_all
+
+
+class _CappedQuery:
+    # Mimics a count="exact" PostgREST read whose max-rows (250 by default) may be below the page size.
+    def __init__(self, rows: list[dict], max_rows: int = 250) -> None:
+        self.rows = rows
+        self.max_rows = max_rows
+        self.start = 0
+        self.end = 0
+        self.requests = 0
+
+    def range(self, start: int, end: int) -> "_CappedQuery":
+        self.start, self.end = start, end
+        return self
+
+    def execute(self) -> SimpleNamespace:
+        self.requests += 1
+        stop = min(self.end + 1, self.start + self.max_rows)
+        return SimpleNamespace(data=self.rows[self.start : stop], count=len(self.rows))
+
+
+def test_fetch_all_is_not_truncated_by_a_lower_server_row_cap():
+    rows = [{"id": i} for i in range(1, 1001)]
+    query = _CappedQuery(rows)
+
+    fetched = list(fetch_all(lambda: query, page_size=1000))
+
+    assert fetched == rows
+    assert query.requests == 4
+
+
+def test_fetch_all_short_result_takes_one_request():
+    rows = [{"id": i} for i in range(1, 4)]
+    query = _CappedQuery(rows, max_rows=1000)
+
+    assert list(fetch_all(lambda: query, page_size=1000)) == rows
+    assert query.requests == 1
@@ -1,6 +1,6 @@
 from datetime import date
 
-from app.services.wait_time import _calc_model_raw, _score_rows
+from app.services.wait_time import SnapshotBatch, _calc_model_raw, _score_rows, _wait_band
 
 
 def test_median_price_and_premium_exact():
@@ -20,7 +20,7 @@ def test_median_price_and_premium_exact():
         model_id=99,
         msrp=10000.0,
         listing_rows=listing_rows,
-        snapshot_rows=snapshot_rows,
+        snapshots=SnapshotBatch.from_rows(snapshot_rows),
         captured_date=captured,
     )
 
@@ -54,14 +54,14 @@ def test_wait_time_index_sanity_high_premium_low_availability_is_higher():
         model_id=1,
         msrp=10000.0,
         listing_rows=scarce_listing_rows,
-        snapshot_rows=scarce_snapshot_rows,
+        snapshots=SnapshotBatch.from_rows(scarce_snapshot_rows),
         captured_date=captured,
     )
     common_raw = _calc_model_raw(
         model_id=2,
         msrp=10000.0,
         listing_rows=common_listing_rows,
-        snapshot_rows=common_snapshot_rows,
+        snapshots=SnapshotBatch.from_rows(common_snapshot_rows),
         captured_date=captured,
     )
 
@@ -72,3 +72,35 @@ def test_wait_time_index_sanity_high_premium_low_availability_is_higher():
     assert scarce_raw.premium_over_msrp > common_raw.premium_over_msrp
     assert scarce_raw.availability_ratio < common_raw.availability_ratio
     assert by_model[1]["wait_time_index"] > by_model[2]["wait_time_index"]
+
+
+def test_median_price_even_count_averages_middle_pair():
+    captured = date(2026, 2, 26)
+    listing_rows = [{"id": i, "created_at": "2026-02-25T10:00:00+00:00"} for i in range(1, 5)]
+    snapshot_rows = [
+        {"listing_id": 1, "price_value": 12000, "availability_flag": True},
+        {"listing_id": 2, "price_value": 9000, "availability_flag": True},
+        {"listing_id": 3, "price_value": 11000, "availability_flag": False},
+        {"listing_id": 4, "price_value": 10000, "availability_flag": False},
+    ]
+
+    raw = _calc_model_raw(
+        model_id=7,
+        msrp=None,
+        listing_rows=listing_rows,
+        snapshots=SnapshotBatch.from_rows(snapshot_rows),
+        captured_date=captured,
+    )
+
+    assert raw is not None
+    assert raw.median_price == 10500.0          # mean of 10000 and 11000
+    assert raw.avg_shipping_days == 7.0         # no shipping data -> default
+
+
+def test_wait_band_boundaries():
+    assert _wait_band(0.0) == "0-6 months"
+    assert _wait_band(0.2499) == "0-6 months"
+    assert _wait_band(0.25) == "6-18 months"       # bounds are exclusive upper limits
+    assert _wait_band(0.65) == "3-5 years"
+    assert _wait_band(0.85) == "5-8+ years"
+    assert _wait_band(1.0) == "5-8+ years"
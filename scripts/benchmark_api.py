@@ -1,21 +1,25 @@
 ﻿from __future__ import annotations
 
 import argparse
+import http.client
 import json
-import math
 import random
-import statistics
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
-from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, MutableSequence
+from urllib.parse import urlencode, urlsplit
 
 
-@dataclass
+_thread_state = threading.local()
+
+
+@dataclass(slots=True)
 class Sample:
     latency_ms: float
     status_code: int
@@ -24,63 +28,116 @@ class Sample:
     error: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskResult:
     final_sample: Sample
     attempts: int
 
 
 def percentile(values: list[float], p: float) -> float:
+    # values must be sorted; linear interpolation between the two closest ranks.
     if not values:
         return 0.0
     if len(values) == 1:
         return values[0]
     p = max(0.0, min(100.0, p))
     k = (len(values) - 1) * (p / 100.0)
-    f = math.floor(k)
-    c = math.ceil(k)
-    if f == c:
-        return values[int(k)]
-    d0 = values[f] * (c - k)
-    d1 = values[c] * (k - f)
-    return d0 + d1
+    f = int(k)
+    frac = k - f
+    if frac == 0.0:
+        return values[f]
+    return values[f] * (1.0 - frac) + values[f + 1] * frac
 
 
-def hit_once(base_url: str, page_size: int, timeout_sec: float, vary_params: bool, seed: int | None) -> Sample:
-    params = {"page": 1, "page_size": page_size}
-    if vary_params:
-        rng = random.Random(seed if seed is not None else time.time_ns())
-        params["page"] = rng.randint(1, 3)
-        params["q"] = rng.choice(["", "Datejust", "Daytona", "116", "126"])
-        params["collection"] = rng.choice(["", "Datejust", "Submariner", "GMT-Master II", "Day-Date"])
+def models_url(base_url: str, params: dict[str, Any]) -> str:
+    return f"{base_url.rstrip('/')}/v1/models?{urlencode(params)}"
 
-    query = urlencode(params)
-    url = f"{base_url.rstrip('/')}/v1/models?{query}"
-    request = Request(url, method="GET")
-    request.add_header("Accept", "application/json")
 
-    started = time.perf_counter()
-    try:
-        with urlopen(request, timeout=timeout_sec) as response:
-            body = response.read()
-            latency = (time.perf_counter() - started) * 1000
-            status = int(getattr(response, "status", 200))
-            return Sample(latency_ms=latency, status_code=status, ok=200 <= status < 300, bytes_len=len(body))
-    except HTTPError as exc:
-        latency = (time.perf_counter() - started) * 1000
-        return Sample(latency_ms=latency, status_code=int(exc.code), ok=False, bytes_len=0, error=str(exc))
-    except (URLError, TimeoutError, OSError) as exc:
-        latency = (time.perf_counter() - started) * 1000
-        return Sample(latency_ms=latency, status_code=0, ok=False, bytes_len=0, error=str(exc))
+def varied_url(base_url: str, page_size: int, rng: random.Random) -> str:
+    params: dict[str, Any] = {"page": rng.randint(1, 3), "page_size": page_size}
+    params["q"] = rng.choice(["", "Datejust", "Daytona", "116", "126"])
+    params["collection"] = rng.choice(["", "Datejust", "Submariner", "GMT-Master II", "Day-Date"])
+    return models_url(base_url, params)
+
+
+def _connection(scheme: str, netloc: str, timeout_sec: float) -> http.client.HTTPConnection:
+    # One keep-alive connection per worker thread, so handshakes scale with concurrency, not requests.
+    conn = getattr(_thread_state, "conn", None)
+    if conn is None or _thread_state.origin != (scheme, netloc):
+        if conn is not None:
+            conn.close()
+        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = conn_cls(netloc, timeout=timeout_sec)
+        _thread_state.conn = conn
+        _thread_state.origin = (scheme, netloc)
+    return conn
+
+
+def _drop_connection() -> None:
+    conn = getattr(_thread_state, "conn", None)
+    if conn is not None:
+        conn.close()
+        _thread_state.conn = None
+
+
+def _drain(response: http.client.HTTPResponse) -> int:
+    # The body must be consumed to reuse the connection, but only its size is reported,
+    # so read into a per-thread scratch buffer instead of allocating a bytes object.
+    buffer = getattr(_thread_state, "buffer", None)
+    if buffer is None:
+        buffer = _thread_state.buffer = memoryview(bytearray(65536))
+    total = 0
+    while n := response.readinto(buffer):
+        total += n
+    return total
+
+
+def hit_once(url: str, timeout_sec: float) -> Sample:
+    parts = urlsplit(url)
+    target = f"{parts.path or '/'}?{parts.query}" if parts.query else parts.path or "/"
+
+    retried_stale = False
+    # Timed from the first attempt, so a stale-socket reconnect is included in the latency.
+    started_ns = time.perf_counter_ns()
+    while True:
+        conn = _connection(parts.scheme, parts.netloc, timeout_sec)
+        reused = conn.sock is not None
+        try:
+            conn.request("GET", target, headers={"Accept": "application/json"})
+            response = conn.getresponse()
+            bytes_len = _drain(response)
+            latency = (time.perf_counter_ns() - started_ns) * 1e-6
+            if response.will_close:
+                _drop_connection()
+            status = int(response.status)
+            if 200 <= status < 300:
+                return Sample(latency_ms=latency, status_code=status, ok=True, bytes_len=bytes_len)
+            return Sample(
+                latency_ms=latency,
+                status_code=status,
+                ok=False,
+                bytes_len=0,
+                error=f"HTTP Error {status}: {response.reason}",
+            )
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+            _drop_connection()
+            # The server may have closed an idle keep-alive socket; reconnect once before reporting.
+            if reused and not retried_stale:
+                retried_stale = True
+                continue
+            latency = (time.perf_counter_ns() - started_ns) * 1e-6
+            return Sample(latency_ms=latency, status_code=0, ok=False, bytes_len=0, error=str(exc))
+        except (http.client.HTTPException, OSError) as exc:
+            # Timeouts and other failures are real results and are never retried here.
+            latency = (time.perf_counter_ns() - started_ns) * 1e-6
+            _drop_connection()
+            return Sample(latency_ms=latency, status_code=0, ok=False, bytes_len=0, error=str(exc))
 
 
 def hit_with_retries(
     *,
-    base_url: str,
-    page_size: int,
+    url: str,
     timeout_sec: float,
-    vary_params: bool,
-    seed: int,
     max_retries: int,
     retry_backoff_ms: int,
 ) -> TaskResult:
@@ -88,7 +145,7 @@ def hit_with_retries(
     last = Sample(latency_ms=0.0, status_code=0, ok=False, bytes_len=0, error="No attempts")
     for attempt in range(max_retries + 1):
         attempts += 1
-        sample = hit_once(base_url, page_size, timeout_sec, vary_params, seed + attempt)
+        sample = hit_once(url, timeout_sec)
         if sample.ok:
             return TaskResult(final_sample=sample, attempts=attempts)
         last = sample
@@ -97,6 +154,72 @@ def hit_with_retries(
     return TaskResult(final_sample=last, attempts=attempts)
 
 
+def _run_requests(
+    urls: list[str],
+    *,
+    warmup_url: str,
+    concurrency: int,
+    timeout_sec: float,
+    warmup: int,
+    max_retries: int,
+    retry_backoff_ms: int,
+    latencies: MutableSequence[float],
+    statuses: MutableSequence[int],
+    offset: int = 0,
+) -> tuple[float, float, int, list[str]]:
+    # Writes each result into latencies/statuses at offset + i and returns
+    # (started_at, finished_at, total_attempts, errors_sample).
+    total_attempts = 0
+    errors_sample: list[str] = []
+    hit = partial(
+        hit_with_retries,
+        timeout_sec=timeout_sec,
+        max_retries=max_retries,
+        retry_backoff_ms=retry_backoff_ms,
+    )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Warm up through the worker pool so each worker's keep-alive connection
+        # is already open when the timed run starts.
+        for _ in pool.map(lambda _: hit_once(warmup_url, timeout_sec), range(max(0, warmup))):
+            pass
+
+        started_at = time.perf_counter()
+        # Completion order is irrelevant to the summary, so map's in-order results are fine.
+        for i, result in enumerate(pool.map(lambda url: hit(url=url), urls), start=offset):
+            s = result.final_sample
+            total_attempts += result.attempts
+            latencies[i] = s.latency_ms
+            statuses[i] = s.status_code
+            if not s.ok and len(errors_sample) < 5 and s.error:
+                errors_sample.append(s.error)
+
+    return started_at, time.perf_counter(), total_attempts, errors_sample
+
+
+def _result_views(buf: memoryview, requests_count: int) -> tuple[memoryview, memoryview]:
+    # Shared layout: requests_count float64 latencies followed by requests_count int16 status codes.
+    split = requests_count * 8
+    return buf[:split].cast("d"), buf[split : split + requests_count * 2].cast("h")
+
+
+def _run_requests_in_shared_memory(
+    shm_name: str,
+    requests_count: int,
+    urls: list[str],
+    offset: int,
+    **kwargs: Any,
+) -> tuple[float, float, int, list[str]]:
+    shm = SharedMemory(name=shm_name)
+    latencies, statuses = _result_views(shm.buf, requests_count)
+    try:
+        return _run_requests(urls, latencies=latencies, statuses=statuses, offset=offset, **kwargs)
+    finally:
+        latencies.release()
+        statuses.release()
+        shm.close()
+
+
 def run_benchmark(
     base_url: str,
     requests_count: int,
@@ -107,48 +230,98 @@ def run_benchmark(
     vary_params: bool,
     max_retries: int,
     retry_backoff_ms: int,
+    processes: int = 1,
 ) -> dict[str, Any]:
-    for i in range(max(0, warmup)):
-        _ = hit_once(base_url, page_size, timeout_sec, vary_params=False, seed=i)
+    # The non-varying URL is a function of constants; format it once per run.
+    fixed_url = models_url(base_url, {"page": 1, "page_size": page_size})
+    if vary_params:
+        # Draw every request's params from one seeded RNG up front instead of per attempt.
+        rng = random.Random(0)
+        request_urls = [varied_url(base_url, page_size, rng) for _ in range(requests_count)]
+    else:
+        request_urls = [fixed_url] * requests_count
 
-    samples: list[Sample] = []
-    total_attempts = 0
-    started_at = time.perf_counter()
+    # Every process needs at least one thread and one request.
+    processes = max(1, min(processes, concurrency, requests_count))
+    options: dict[str, Any] = {
+        "warmup_url": fixed_url,
+        "timeout_sec": timeout_sec,
+        "max_retries": max_retries,
+        "retry_backoff_ms": retry_backoff_ms,
+    }
 
-    with ThreadPoolExecutor(max_workers=concurrency) as pool:
-        futures = [
-            pool.submit(
-                hit_with_retries,
-                base_url=base_url,
-                page_size=page_size,
-                timeout_sec=timeout_sec,
-                vary_params=vary_params,
-                seed=i,
-                max_retries=max_retries,
-                retry_backoff_ms=retry_backoff_ms,
+    if processes == 1:
+        latencies: MutableSequence[float] = array("d", bytes(requests_count * 8))
+        statuses: MutableSequence[int] = array("h", bytes(requests_count * 2))
+        runs = [
+            _run_requests(
+                request_urls,
+                concurrency=concurrency,
+                warmup=warmup,
+                latencies=latencies,
+                statuses=statuses,
+                **options,
             )
-            for i in range(requests_count)
         ]
-        for fut in as_completed(futures):
-            result = fut.result()
-            samples.append(result.final_sample)
-            total_attempts += result.attempts
+    else:
+        # Each process runs its own thread pool over a contiguous slice of the requests and
+        # writes results straight into shared memory, so no per-request data is pickled back.
+        # Requests, threads and warmups are dealt out with divmod so the totals match the arguments.
+        requests_each, requests_extra = divmod(requests_count, processes)
+        threads_each, threads_extra = divmod(concurrency, processes)
+        warmup_each, warmup_extra = divmod(warmup, processes)
+        shm = SharedMemory(create=True, size=requests_count * 10)
+        try:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = []
+                offset = 0
+                for k in range(processes):
+                    slice_len = requests_each + (k < requests_extra)
+                    futures.append(
+                        pool.submit(
+                            _run_requests_in_shared_memory,
+                            shm.name,
+                            requests_count,
+                            request_urls[offset : offset + slice_len],
+                            offset,
+                            concurrency=threads_each + (k < threads_extra),
+                            warmup=warmup_each + (k < warmup_extra),
+                            **options,
+                        )
+                    )
+                    offset += slice_len
+                runs = [fut.result() for fut in futures]
+            latency_view, status_view = _result_views(shm.buf, requests_count)
+            latencies, statuses = latency_view.tolist(), status_view.tolist()
+            latency_view.release()
+            status_view.release()
+        finally:
+            shm.close()
+            shm.unlink()
 
-    total_duration_sec = max(time.perf_counter() - started_at, 1e-9)
+    # perf_counter is a system-wide monotonic clock on Linux, macOS and Windows,
+    # so worker timestamps compare across processes.
+    total_duration_sec = max(max(run[1] for run in runs) - min(run[0] for run in runs), 1e-9)
+    total_attempts = sum(run[2] for run in runs)
+    errors_sample = [error for run in runs for error in run[3]][:5]
 
-    latencies = sorted(s.latency_ms for s in samples)
-    ok_samples = [s for s in samples if s.ok]
-    error_samples = [s for s in samples if not s.ok]
+    # HTTP status codes are small ints (0 for transport errors), so count them in fixed bins.
+    status_bins = [0] * 1000
+    for code in statuses:
+        status_bins[code] += 1
+    # hit_once only marks 2xx responses as ok.
+    success_count = sum(status_bins[200:300])
+    error_count = requests_count - success_count
+    latency_total = sum(latencies)
+    latencies = sorted(latencies)
 
+    # Latencies are sorted, so min/max are the ends.
     p50 = percentile(latencies, 50)
     p95 = percentile(latencies, 95)
-    avg = statistics.fmean(latencies) if latencies else 0.0
-    throughput = len(samples) / total_duration_sec
-
-    status_counts: dict[str, int] = {}
-    for s in samples:
-        key = str(s.status_code)
-        status_counts[key] = status_counts.get(key, 0) + 1
+    avg = latency_total / len(latencies) if latencies else 0.0
+    min_latency = latencies[0] if latencies else 0.0
+    max_latency = latencies[-1] if latencies else 0.0
+    throughput = requests_count / total_duration_sec
 
     return {
         "timestamp_utc": datetime.now(timezone.utc).isoformat(),
@@ -156,25 +329,26 @@ def run_benchmark(
         "endpoint": "/v1/models",
         "requests": requests_count,
         "concurrency": concurrency,
+        "processes": processes,
         "page_size": page_size,
         "warmup_requests": warmup,
         "vary_params": vary_params,
         "max_retries": max_retries,
         "retry_backoff_ms": retry_backoff_ms,
         "total_attempts": total_attempts,
-        "total_duration_sec": round(total_duration_sec, 4),
-        "throughput_rps": round(throughput, 2),
+        "total_duration_sec": total_duration_sec,
+        "throughput_rps": throughput,
         "latency_ms": {
-            "avg": round(avg, 2),
-            "p50": round(p50, 2),
-            "p95": round(p95, 2),
-            "min": round(min(latencies) if latencies else 0.0, 2),
-            "max": round(max(latencies) if latencies else 0.0, 2),
+            "avg": avg,
+            "p50": p50,
+            "p95": p95,
+            "min": min_latency,
+            "max": max_latency,
         },
-        "success_count": len(ok_samples),
-        "error_count": len(error_samples),
-        "status_counts": status_counts,
-        "errors_sample": [s.error for s in error_samples[:5] if s.error],
+        "success_count": success_count,
+        "error_count": error_count,
+        "status_counts": {str(code): count for code, count in enumerate(status_bins) if count},
+        "errors_sample": errors_sample,
     }
 
 
@@ -183,6 +357,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API base URL")
     parser.add_argument("--requests", type=int, default=300, help="Total request count")
     parser.add_argument("--concurrency", type=int, default=20, help="Parallel workers")
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Worker processes; --concurrency is split across them"
+    )
     parser.add_argument("--page-size", type=int, default=25, help="page_size query param")
     parser.add_argument("--timeout-sec", type=float, default=10.0, help="Per-request timeout")
     parser.add_argument("--warmup", type=int, default=20, help="Warmup request count")
@@ -206,23 +383,32 @@ def main() -> None:
         vary_params=bool(args.vary_params),
         max_retries=max(0, args.max_retries),
         retry_backoff_ms=max(0, args.retry_backoff_ms),
+        processes=max(1, args.processes),
     )
 
     print("Benchmark complete")
     print(f"Endpoint: {report['base_url']}{report['endpoint']}")
-    print(f"Requests: {report['requests']} | Concurrency: {report['concurrency']} | Warmup: {report['warmup_requests']}")
-    print(f"Success: {report['success_count']} | Errors: {report['error_count']} | Throughput: {report['throughput_rps']} rps")
+    print(
+        f"Requests: {report['requests']} | Concurrency: {report['concurrency']} "
+        f"| Processes: {report['processes']} | Warmup: {report['warmup_requests']}"
+    )
+    print(
+        f"Success: {report['success_count']} | Errors: {report['error_count']} "
+        f"| Throughput: {report['throughput_rps']:.2f} rps"
+    )
     print(
         f"Retries: max={report['max_retries']} backoff_ms={report['retry_backoff_ms']} "
         f"| total_attempts={report['total_attempts']}"
     )
+    # The report keeps full precision; only the terminal summary is rounded.
+    latency = report["latency_ms"]
     print(
         "Latency (ms): "
-        f"avg={report['latency_ms']['avg']} "
-        f"p50={report['latency_ms']['p50']} "
-        f"p95={report['latency_ms']['p95']} "
-        f"min={report['latency_ms']['min']} "
-        f"max={report['latency_ms']['max']}"
+        f"avg={latency['avg']:.2f} "
+        f"p50={latency['p50']:.2f} "
+        f"p95={latency['p95']:.2f} "
+        f"min={latency['min']:.2f} "
+        f"max={latency['max']:.2f}"
     )
     print(f"Status counts: {report['status_counts']}")
 